@@ -0,0 +1,222 @@
+###############################################################################
+#
+# ETL Project - benchmark with synthetic mortality data
+#
+# Generates synthetic <yr>_data.csv and <yr>_codes.json files with values drawn
+# from the code domains (real codes JSON if available, otherwise a generated
+# domain per get_clean() column), with NaN in the columns the clean directives
+# fill. Then times each stage of the pipeline : read_codes, read_csv, checks,
+# clean and the person load into a local sqlite database.
+#
+# Results of each run are written as a JSON run report in bench_path, and a one
+# line summary per stage is appended to bench_path/history.jsonl so runs can
+# be compared. Generated data is kept and reused for the same size and seed.
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_prep_utilities as utl
+import db_load_utilities as dbl
+import perf_utilities as perf
+
+# Run control variables
+bench_rows  = [100000, 1000000]   # Rows per year, add 10000000 for the full size run
+bench_years = [2015]              # Years of data generated and processed
+bench_seed  = 0                   # Random seed for generated data
+nan_frac    = 0.05                # Fraction of NaN in columns with a fill value
+drop_nan    = 0.9                 # Fraction of NaN in dropped columns (mostly empty condition columns)
+
+code_path  = './source_data/'     # Real JSON codes, used for the domains if present
+bench_path = './bench_results/'   # Generated data, sqlite database and results
+
+db_block  = 50000
+db_chunk  = 5000
+db_method = 'executemany'
+
+keepcols = ['age_recode_52', 'age_recode_27', 'age_recode_12', 'infant_age_recode_22']
+
+
+###############################################################################
+#
+# Code superset for synthetic data. Real 2015 codes if available, otherwise
+# generated codes for each column with a code in get_clean(), including the
+# fill values and the codes patched by read_codes()
+#
+
+def get_synthetic_codes(clean, path=code_path) :
+    file = os.path.join(path, '2015_codes.json')
+    if os.path.exists(file) :
+        return utl.read_code(path, 2015)
+
+    codes = {}
+    for key in clean :
+        if clean[key][-1] == 'No code' :
+            continue
+        codes[key] = {f'{i:02d}':f'{key} code {i}' for i in range(1, 10)}
+        if clean[key][0] not in ['None', 'Drop'] :
+            codes[key][clean[key][0]] = clean[key][-1]
+    codes['icd_code_10th_revision'] = {}
+
+    for first, last, key, valkey, value in utl.code_patches :
+        codes[key][valkey] = value
+    return codes
+
+
+###############################################################################
+#
+# Write JSON code files for all code years, equal to the superset after the
+# read_codes() patches (outlier keys as found in the source files)
+#
+
+def write_synthetic_codes(path, codes) :
+    for yr in utl.code_years :
+        d_json = dict(codes)
+        d_json['current_data_year'] = {str(yr):str(yr)}
+        for fix_yr, old_key, new_key, from_yr in utl.code_key_fixes :
+            if yr == fix_yr :
+                d_json[old_key] = d_json.pop(new_key)
+        with open(os.path.join(path, f'{yr}_codes.json'), 'w') as f_out :
+            json.dump(d_json, f_out)
+
+
+###############################################################################
+#
+# Write a synthetic data file for a year with nrows rows
+#
+
+def write_synthetic_data(path, year, nrows, codes, clean, seed=0) :
+    rng  = np.random.default_rng(seed+year)
+    data = {}
+
+    for key in clean :
+        if key == 'current_data_year' :
+            data[key] = np.full(nrows, str(year), dtype=object)
+            continue
+        if (key in codes) and codes[key] :
+            domain = np.array(list(codes[key].keys()), dtype=object)
+        elif key == 'detail_age' :
+            domain = np.array([str(i) for i in range(1, 120)], dtype=object)
+        else :   # ICD-10 like codes for conditions and underlying cause
+            domain = np.array([f'{chr(65+i%26)}{i%100:02d}{i%10}' for i in range(2000)], dtype=object)
+
+        col = domain[rng.integers(0, len(domain), nrows)]
+        if clean[key][0] == 'Drop' :
+            col[rng.random(nrows) < drop_nan] = None
+        elif clean[key][0] != 'None' :
+            col[rng.random(nrows) < nan_frac] = None
+        data[key] = col
+
+    df = pd.DataFrame(data)
+    if year == 2012 :
+        df.rename(columns={'icd_code_10th_revision':'icd_code_10'}, inplace=True)
+    df.to_csv(os.path.join(path, f'{year}_data.csv'), index=False)
+
+
+###############################################################################
+#
+# Generate data set for nrows rows per year, reused if already generated
+#
+
+def make_synthetic(path, nrows, years, clean, seed=0) :
+    os.makedirs(path, exist_ok=True)
+    codes = get_synthetic_codes(clean)
+    write_synthetic_codes(path, codes)
+
+    for yr in years :
+        if not os.path.exists(os.path.join(path, f'{yr}_data.csv')) :
+            print(f'Generate {nrows} rows for {yr} ...')
+            write_synthetic_data(path, yr, nrows, codes, clean, seed=seed)
+    return codes
+
+
+###############################################################################
+#
+# Time each stage for one data set
+#
+
+def run_benchmark(path, db_file, years, clean) :
+    with perf.stage('read_codes') :
+        codes = utl.read_codes(path)
+    categories = utl.get_categories(codes, clean)
+
+    data = {}
+    for yr in years :
+        with perf.stage(f'read_csv {yr}') as rec :
+            data[yr] = utl.read_data(path, yr, categories=categories)
+            rec['rows_out'] = data[yr].shape[0]
+
+    with perf.stage('checks') :
+        utl.check_df_columns(data)
+        utl.check_replacement_codes(codes, clean)
+        utl.check_replacement_columns(data[years[-1]].columns, clean)
+    for yr in years :
+        with perf.stage(f'check_data_values {yr}', rows_in=data[yr].shape[0]) :
+            utl.check_data_values(data[yr], codes, clean)
+
+    drop, fill = utl.get_clean_directives(clean)
+    for yr in years :
+        with perf.stage(f'clean {yr}', rows_in=data[yr].shape[0]) :
+            data[yr].drop(columns=drop, inplace=True)
+            data[yr].fillna(fill, inplace=True)
+
+    if os.path.exists(db_file) :
+        os.remove(db_file)
+    eng = dbl.get_engine('sqlite', db_method, db_file)
+    for k in keepcols :
+        dbl.execute(eng, f"CREATE TABLE IF NOT EXISTS {k}( ckey VARCHAR(255) NOT NULL PRIMARY KEY, cvalue VARCHAR(1024) );")
+    dbl.execute(eng, dbl.get_person_ddl(keepcols))
+
+    ddf = data[years[-1]][keepcols].rename(columns={c:'fk_'+c for c in keepcols})
+    ddf.index.names = ['id']
+    with perf.stage('load_person', rows_in=ddf.shape[0]) as rec :
+        rec['rows_out'] = dbl.load_table(ddf, 'person', eng, method=db_method, block=db_block,
+                                         chunksize=db_chunk, verbose=False)
+
+
+###############################################################################
+#
+# Print change in wall time per stage against the previous run of same size
+#
+
+def compare_history(history, nrows, results) :
+    prev = None
+    if os.path.exists(history) :
+        with open(history, 'r') as f_in :
+            runs = [json.loads(l) for l in f_in if l.strip()]
+        runs = [r for r in runs if r['nrows'] == nrows]
+        prev = runs[-1] if runs else None
+    if prev is None :
+        return
+
+    print(f"Compared to run at {prev['time']} :")
+    for stage, secs in results.items() :
+        if stage in prev['stages'] and prev['stages'][stage] > 0 :
+            print(f"{stage:<32} : {secs:8.2f} secs, was {prev['stages'][stage]:8.2f} "
+                  f"({100*(secs/prev['stages'][stage]-1):+.0f}%)")
+
+
+if __name__ == '__main__' :
+    clean   = utl.get_clean()
+    history = os.path.join(bench_path, 'history.jsonl')
+
+    for nrows in bench_rows :
+        print(f'\nBENCHMARK {nrows} rows ...')
+        path = os.path.join(bench_path, f'data_{nrows}_{bench_seed}')
+        make_synthetic(path, nrows, bench_years, clean, seed=bench_seed)
+
+        perf.reset()
+        run_benchmark(path, os.path.join(bench_path, 'bench.db'), bench_years, clean)
+        perf.print_summary()
+
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        perf.write_report(os.path.join(bench_path, f'report_{nrows}_{stamp}.json'),
+                          run={'nrows':nrows, 'years':bench_years, 'db_method':db_method, 'db_block':db_block})
+
+        results = {rec['stage']:rec['wall_secs'] for rec in perf.stages}
+        compare_history(history, nrows, results)
+        with open(history, 'a') as f_out :
+            f_out.write(json.dumps({'time':time.strftime('%Y-%m-%d %H:%M:%S'), 'nrows':nrows, 'stages':results})+'\n')
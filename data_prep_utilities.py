@@ -28,50 +28,97 @@
 #    and is obviously different between each file
 # 2) Considered deletion of key 'icd_code_10th_revision' as it has no information
 
+import hashlib
+import heapq
+import importlib.util
 import json
+import multiprocessing
 import os
+import re
+import shutil
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import perf_utilities as perf
 
 ###############################################################################
 #
-# Function to recursively check equivalence of nested dictionary/lists
+# numpy and pandas are imported on first use, so code checks that only read
+# the JSON files start without the cost of importing them
 #
 
-def compare_seq(seq1, seq2, verbose=False) :
+def lazy_import(name) :
+    if name in sys.modules :
+        return sys.modules[name]
+    spec   = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
 
-    if type(seq1)== dict and type(seq2)==dict :   # Input sequences are dictionaires
-        keys1 = list(seq1.keys())
-        keys2 = list(seq2.keys())
-        if len(keys1) == len(keys2) :
-            for key in keys1 :
-                if key in keys2 :
-                    if not(compare_seq(seq1[key], seq2[key])) :
-                        if verbose : print(f'Compare failed {key}:{seq1[key]} - {seq2[key]}')
-                        return False
-                else :
-                    if verbose : print(f'Key not found {key}:{keys2}')
-                    return False
-            return True
-        else :
-            if verbose : print(f'Key length not equal {len(keys1)}, {len(keys2)}')
-            return False
-
-    elif type(seq1)== list and type(seq1)==type(seq2) :
-            if len(seq1)==len(seq2) :
-                for l in seq1 :
-                    if not(l in seq2) :
-                        if verbose : print(f'List member not found {l}')
-                        return False
-                return True
-            else :
-                if verbose : print('List length not equal {len(seq1)}, {len(seq2)}')
-                return False
-    else :
-        if seq1==seq2 :
-            return True
-        elif seq1!=seq1 and seq2!=seq2 :  # To accomodate nan equivalence
-            return True
-        else :
-            return False
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+###############################################################################
+#
+# Functions to find all differences between nested dictionary/lists in a 
+# single pass. Dictionaries are compared by key set, lists are compared 
+# ignoring order by counting hashable (frozen) copies of their members, and
+# nan is equivalent to nan.
+#
+# Differences are returned as a list of (kind, path, value1, value2), kind is
+# 'added' (only in seq2), 'removed' (only in seq1) or 'changed', path is the 
+# tuple of keys to the value. For list members the path is the path of the list
+#
+
+def freeze_seq(seq) :
+    if type(seq) == dict :
+        return ('dict', frozenset((key, freeze_seq(val)) for key, val in seq.items()))
+    elif type(seq) == list :
+        return ('list', frozenset(Counter(freeze_seq(l) for l in seq).items()))
+    elif seq != seq :    # nan
+        return ('nan',)
+    return seq
+
+def diff_seq(seq1, seq2, path=()) :
+    diffs = []
+
+    if type(seq1) == dict and type(seq2) == dict :   # Input sequences are dictionaires
+        diffs += [('removed', path+(key,), seq1[key], None) for key in seq1 if not (key in seq2)]
+        diffs += [('added',   path+(key,), None, seq2[key]) for key in seq2 if not (key in seq1)]
+        for key in seq1 :
+            if key in seq2 :
+                diffs += diff_seq(seq1[key], seq2[key], path+(key,))
+
+    elif type(seq1) == list and type(seq2) == list :
+        frozen1 = {freeze_seq(l):l for l in seq1}
+        frozen2 = {freeze_seq(l):l for l in seq2}
+        count1  = Counter(freeze_seq(l) for l in seq1)
+        count2  = Counter(freeze_seq(l) for l in seq2)
+        if count1 != count2 :
+            diffs += [('removed', path, frozen1[f], None) for f in (count1-count2)]
+            diffs += [('added',   path, None, frozen2[f]) for f in (count2-count1)]
+
+    elif not (seq1 == seq2 or (seq1 != seq1 and seq2 != seq2)) :  # To accomodate nan equivalence
+        diffs.append(('changed', path, seq1, seq2))
+
+    return diffs
+
+###############################################################################
+#
+# Function to check equivalence of nested dictionary/lists, prints every
+# difference if verbose
+#
+
+def compare_seq(seq1, seq2, verbose=False) :
+    diffs = diff_seq(seq1, seq2)
+    if verbose :
+        for kind, path, val1, val2 in diffs :
+            print(f'Compare failed, {kind} {"/".join(map(str, path))} : {val1} - {val2}')
+    return not diffs
 
 #################################################
 #
@@ -90,126 +137,193 @@ def read_code (path, year) :
 
 #################################################
 #
-# Read in all JSON file input, return single JSON object
-# 
-def read_codes (path, verbose=False) :
-
-    # Read JSON for each year for comparison, 
-    # save objects in dictionary key'd by year
-  
-    d_json = {}
-    for yr in range(2005, 2015+1) :
-        read_code(path, yr)
-        d_json[yr] = read_code(path, yr)
+# Year to year differences in the JSON code files. Each entry updates one code
+# description for a range of years to match the later years :
+# (first year, last year, code key, code value key, description)
+# Entries are applied in order
+#
 
-#        with open(os.path.join(path, str(yr)+'_codes.json'), 'r') as f_in:
-#            d_json[yr] = json.load(f_in)
-#            del(d_json[yr]['current_data_year'])
-#        pass
+code_years = range(2005, 2015+1)   # Years with JSON code files
+code_ref   = 2015                  # Reference year, returned as superset
 
+code_patches = [
     # Update JSON for years 2005 - 2009 to match 2010
 
-    yrs_to_fix = range(2005, 2009+1)
-
-    for yr in yrs_to_fix : 
-        d_json[yr]['age_recode_27']['01']='Under 1 month (includes not stated weeks, days, hours, and minutes)'   # Add '... and minutes'
-        d_json[yr]['age_recode_27']['03']='1 year'   # Was 'years'
-        
-        d_json[yr]['place_of_injury_for_causes_w00_y34_except_y06_and_y07_']['2']='School, other institution and public administrative area'   # Add ' area'
-
-        d_json[yr]['race']['03']='American Indian (includes Aleuts and Eskimos)'   # Whitespace
-
-        d_json[yr]['358_cause_recode']['001']='I.  Certain infectious and parasitic diseases (A00-B99)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['156']='IV.  Endocrine, nutritional and metabolic diseases (E00-E88)'   # Whitespace
-        d_json[yr]['358_cause_recode']['174']='V.  Mental and behavioral disorders (F01-F99)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['185']='VI.  Diseases of the nervous system (G00-G98)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['195']='VII.  Diseases of the eye and adnexa (H00-H57)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['196']='VIII.  Diseases of the ear and mastoid process (H60-H93)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['197']='IX.  Diseases of the circulatory system (I00-I99)'   # Whitespace
-        d_json[yr]['358_cause_recode']['205']='Hypertensive diseases (I10-I15)'  # Was I13
-        d_json[yr]['358_cause_recode']['208']='Hypertensive renal disease (I12,I15)'  # Was (I12)
-        d_json[yr]['358_cause_recode']['247']='X.  Diseases of the respiratory system (J00-J98,U04)'  # Was (J00-J98)
-        d_json[yr]['358_cause_recode']['252']='Other diseases of the respiratory system (J09-J98,U04)'  # Was (J09-J98)
-        d_json[yr]['358_cause_recode']['253']='Influenza (J09-J11)'  # Was (J10-J11)
-        d_json[yr]['358_cause_recode']['258']='Other acute lower respiratory infections (J20-J22,U04)'   # Was (J20-J22)
-        d_json[yr]['358_cause_recode']['260']='Other and unspecified acute lower respiratory infection (J22,U04)'  # Waas (J22)
-    #   d_json[yr]['358_cause_recode']['279']='XI.Diseases of the digestive system (K00-K92)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['307']='XII.Diseases of the skin and subcutaneous tissue (L00-L98)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['310']='XIII.  Diseases of the musculoskeletal system and connective tissue (M00-M99)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['319']='XIV.Diseases of the genitourinary system (N00-N98)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['339']='XV.Pregnancy, childbirth and the puerperium (O00-O99)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['356']='XVI.Certain conditions originating in the perinatal period (P00-P96)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['365']='XVII.  Congenital malformations, deformations and chromosomal abnormalities (Q00-Q99)'   # Whitespace
-    #   d_json[yr]['358_cause_recode']['375']='XVIII.Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified (R00-R99)'   # Whitespace
-        d_json[yr]['358_cause_recode']['381']='XX.External causes of mortality (*U01-*U03,V01-Y89)'   # Whitespace
-        d_json[yr]['358_cause_recode']['384']='Railway accidents (V05,V15,V80.6,V81.2-V81.9)'   # *** Need to check this
-        
-        d_json[yr]['113_cause_recode']['069']='Essential (primary) hypertension and hypertensive renal disease (I10,I12,I15)'   # Was (I10,I12)
-        d_json[yr]['113_cause_recode']['076']='Influenza and pneumonia (J09-J18)'   # Was (J10-J18)
-        d_json[yr]['113_cause_recode']['077']='Influenza (J09-J11)'   # Was (J10-J18)
-        d_json[yr]['113_cause_recode']['079']='Other acute lower respiratory infections (J20-J22,U04)'   # Was (J20-J22)
-        d_json[yr]['113_cause_recode']['081']='Other and unspecified acute lower respiratory infection (J22,U04)'   # Was (J22)
-
-        d_json[yr]['130_infant_cause_recode']['053']='Diseases of the respiratory system (J00-J98,U04)'   # Was (J00-J98)
-        d_json[yr]['130_infant_cause_recode']['055']='Influenza and pneumonia (J09-J18)'   # Was (J10-J18)
-        d_json[yr]['130_infant_cause_recode']['056']='Influenza (J09-J11)'   # Was (J10-J11)
-        d_json[yr]['130_infant_cause_recode']['062']='Other and unspecified diseases of respiratory system (J22,J30-J39,J43-J44,J47-J68,J70-J98,U04)'   # Add (,U04)
-        d_json[yr]['130_infant_cause_recode']['158']='Other external causes (X60-X84,Y10-Y36)'   # Added (X60-X84,)
-
-        d_json[yr]['39_cause_recode']['023']='Essential (primary) hypertension and hypertensive renal disease (I10,I12,I15)'   # Was (I10,I12)
-        d_json[yr]['39_cause_recode']['027']='Influenza and pneumonia (J09-J18)'   # Was (J10-J18)
-        d_json[yr]['39_cause_recode']['037']='All other diseases (Residual) (A00-A09,A20-A49,A54-B19,B25-B99,D00-E07, E15-G25,G31-H93,I80-J06,J20-J39,J60-K22,K29-K66,K71-K72, K75-M99,N10-N15,N20-N23,N28-N98,U04)'   # Added (,U04)
+    (2005, 2009, 'age_recode_27', '01', 'Under 1 month (includes not stated weeks, days, hours, and minutes)'),   # Add '... and minutes'
+    (2005, 2009, 'age_recode_27', '03', '1 year'),   # Was 'years'
 
-    # Update JSON for years 2005 - 2010 to match 2011
+    (2005, 2009, 'place_of_injury_for_causes_w00_y34_except_y06_and_y07_', '2', 'School, other institution and public administrative area'),   # Add ' area'
 
-    yrs_to_fix = range(2005, 2010+1) 
+    (2005, 2009, 'race', '03', 'American Indian (includes Aleuts and Eskimos)'),   # Whitespace
 
-    for yr in yrs_to_fix : 
-        d_json[yr]['358_cause_recode']['102']='Kaposi’s sarcoma (C46)'   # Was 'Kaposi=s', typo
-        d_json[yr]['358_cause_recode']['194']='All other diseases of nervous system (G10-G14,G23-G25,G31,G36-G37,G43-G44,G47-G72,G81-G98)'   # Was (G10-G12, ...)
-        d_json[yr]['113_cause_recode']['111']='All other diseases (Residual) (D65-E07,E15-E34,E65-F99,G04-G14,G23-G25,G31-H93, K00-K22,K29-K31,K50-K66,K71-K72,K75-K76,K83-M99, N13.0-N13.5,N13.7-N13.9, N14,N15.0,N15.8-N15.9,N20-N23,N28-N39,N41-N64,N80-N98)'   # Was (... ,G04-G12, ...)
-    
+    (2005, 2009, '358_cause_recode', '001', 'I.  Certain infectious and parasitic diseases (A00-B99)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '156', 'IV.  Endocrine, nutritional and metabolic diseases (E00-E88)'),   # Whitespace
+    (2005, 2009, '358_cause_recode', '174', 'V.  Mental and behavioral disorders (F01-F99)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '185', 'VI.  Diseases of the nervous system (G00-G98)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '195', 'VII.  Diseases of the eye and adnexa (H00-H57)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '196', 'VIII.  Diseases of the ear and mastoid process (H60-H93)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '197', 'IX.  Diseases of the circulatory system (I00-I99)'),   # Whitespace
+    (2005, 2009, '358_cause_recode', '205', 'Hypertensive diseases (I10-I15)'),   # Was I13
+    (2005, 2009, '358_cause_recode', '208', 'Hypertensive renal disease (I12,I15)'),   # Was (I12)
+    (2005, 2009, '358_cause_recode', '247', 'X.  Diseases of the respiratory system (J00-J98,U04)'),   # Was (J00-J98)
+    (2005, 2009, '358_cause_recode', '252', 'Other diseases of the respiratory system (J09-J98,U04)'),   # Was (J09-J98)
+    (2005, 2009, '358_cause_recode', '253', 'Influenza (J09-J11)'),   # Was (J10-J11)
+    (2005, 2009, '358_cause_recode', '258', 'Other acute lower respiratory infections (J20-J22,U04)'),   # Was (J20-J22)
+    (2005, 2009, '358_cause_recode', '260', 'Other and unspecified acute lower respiratory infection (J22,U04)'),   # Waas (J22)
+#   (2005, 2009, '358_cause_recode', '279', 'XI.Diseases of the digestive system (K00-K92)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '307', 'XII.Diseases of the skin and subcutaneous tissue (L00-L98)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '310', 'XIII.  Diseases of the musculoskeletal system and connective tissue (M00-M99)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '319', 'XIV.Diseases of the genitourinary system (N00-N98)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '339', 'XV.Pregnancy, childbirth and the puerperium (O00-O99)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '356', 'XVI.Certain conditions originating in the perinatal period (P00-P96)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '365', 'XVII.  Congenital malformations, deformations and chromosomal abnormalities (Q00-Q99)'),   # Whitespace
+#   (2005, 2009, '358_cause_recode', '375', 'XVIII.Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified (R00-R99)'),   # Whitespace
+    (2005, 2009, '358_cause_recode', '381', 'XX.External causes of mortality (*U01-*U03,V01-Y89)'),   # Whitespace
+    (2005, 2009, '358_cause_recode', '384', 'Railway accidents (V05,V15,V80.6,V81.2-V81.9)'),   # *** Need to check this
+
+    (2005, 2009, '113_cause_recode', '069', 'Essential (primary) hypertension and hypertensive renal disease (I10,I12,I15)'),   # Was (I10,I12)
+    (2005, 2009, '113_cause_recode', '076', 'Influenza and pneumonia (J09-J18)'),   # Was (J10-J18)
+    (2005, 2009, '113_cause_recode', '077', 'Influenza (J09-J11)'),   # Was (J10-J18)
+    (2005, 2009, '113_cause_recode', '079', 'Other acute lower respiratory infections (J20-J22,U04)'),   # Was (J20-J22)
+    (2005, 2009, '113_cause_recode', '081', 'Other and unspecified acute lower respiratory infection (J22,U04)'),   # Was (J22)
+
+    (2005, 2009, '130_infant_cause_recode', '053', 'Diseases of the respiratory system (J00-J98,U04)'),   # Was (J00-J98)
+    (2005, 2009, '130_infant_cause_recode', '055', 'Influenza and pneumonia (J09-J18)'),   # Was (J10-J18)
+    (2005, 2009, '130_infant_cause_recode', '056', 'Influenza (J09-J11)'),   # Was (J10-J11)
+    (2005, 2009, '130_infant_cause_recode', '062', 'Other and unspecified diseases of respiratory system (J22,J30-J39,J43-J44,J47-J68,J70-J98,U04)'),   # Add (,U04)
+    (2005, 2009, '130_infant_cause_recode', '158', 'Other external causes (X60-X84,Y10-Y36)'),   # Added (X60-X84,)
+
+    (2005, 2009, '39_cause_recode', '023', 'Essential (primary) hypertension and hypertensive renal disease (I10,I12,I15)'),   # Was (I10,I12)
+    (2005, 2009, '39_cause_recode', '027', 'Influenza and pneumonia (J09-J18)'),   # Was (J10-J18)
+    (2005, 2009, '39_cause_recode', '037', 'All other diseases (Residual) (A00-A09,A20-A49,A54-B19,B25-B99,D00-E07, E15-G25,G31-H93,I80-J06,J20-J39,J60-K22,K29-K66,K71-K72, K75-M99,N10-N15,N20-N23,N28-N98,U04)'),   # Added (,U04)
+
+    # Update JSON for years 2005 - 2010 to match 2011
+
+    (2005, 2010, '358_cause_recode', '102', 'Kaposi’s sarcoma (C46)'),   # Was 'Kaposi=s', typo
+    (2005, 2010, '358_cause_recode', '194', 'All other diseases of nervous system (G10-G14,G23-G25,G31,G36-G37,G43-G44,G47-G72,G81-G98)'),   # Was (G10-G12, ...)
+    (2005, 2010, '113_cause_recode', '111', 'All other diseases (Residual) (D65-E07,E15-E34,E65-F99,G04-G14,G23-G25,G31-H93, K00-K22,K29-K31,K50-K66,K71-K72,K75-K76,K83-M99, N13.0-N13.5,N13.7-N13.9, N14,N15.0,N15.8-N15.9,N20-N23,N28-N39,N41-N64,N80-N98)'),   # Was (... ,G04-G12, ...)
 
     # Update JSON for years 2005 - 2013 to match 2014
     # Additional whitespace corrections
 
-    yrs_to_fix = range(2005, 2013+1) 
+    (2005, 2013, '358_cause_recode', '156', 'IV. Endocrine, nutritional and metabolic diseases (E00-E88)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '185', 'VI. Diseases of the nervous system (G00-G98)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '195', 'VII. Diseases of the eye and adnexa (H00-H57)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '196', 'VIII. Diseases of the ear and mastoid process (H60-H93)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '197', 'IX. Diseases of the circulatory system (I00-I99)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '279', 'XI. Diseases of the digestive system (K00-K92)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '307', 'XII. Diseases of the skin and subcutaneous tissue (L00-L98)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '310', 'XIII. Diseases of the musculoskeletal system and connective tissue (M00-M99)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '319', 'XIV. Diseases of the genitourinary system (N00-N98)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '339', 'XV. Pregnancy, childbirth and the puerperium (O00-O99)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '356', 'XVI. Certain conditions originating in the perinatal period (P00-P96)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '365', 'XVII. Congenital malformations, deformations and chromosomal abnormalities (Q00-Q99)'),   # Whitespace
+    (2005, 2013, '358_cause_recode', '375', 'XVIII. Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified (R00-R99)'),   # Whitespace
+]
+
+# Outlier code keys : (year, key in file, expected key, year to copy value from)
+code_key_fixes = [
+    (2012, 'icd_code_10', 'icd_code_10th_revision', 2011),
+]
+
+#################################################
+#
+# Apply code patches and key fixes to JSON code objects, key'd by year
+#
+def patch_codes (d_json) :
+    for first, last, key, valkey, value in code_patches :
+        for yr in range(first, last+1) :
+            d_json[yr][key][valkey] = value
 
-    for yr in yrs_to_fix : 
-        d_json[yr]['358_cause_recode']['156']='IV. Endocrine, nutritional and metabolic diseases (E00-E88)'   # Whitespace    
-        d_json[yr]['358_cause_recode']['185']='VI. Diseases of the nervous system (G00-G98)'   # Whitespace    
-        d_json[yr]['358_cause_recode']['195']='VII. Diseases of the eye and adnexa (H00-H57)'   # Whitespace    
-        d_json[yr]['358_cause_recode']['196']='VIII. Diseases of the ear and mastoid process (H60-H93)'   # Whitespace    
-        d_json[yr]['358_cause_recode']['197']='IX. Diseases of the circulatory system (I00-I99)'   # Whitespace  
-        d_json[yr]['358_cause_recode']['279']='XI. Diseases of the digestive system (K00-K92)'   # Whitespace  
-        d_json[yr]['358_cause_recode']['307']='XII. Diseases of the skin and subcutaneous tissue (L00-L98)'   # Whitespace  
-        d_json[yr]['358_cause_recode']['310']='XIII. Diseases of the musculoskeletal system and connective tissue (M00-M99)'   # Whitespace  
-        d_json[yr]['358_cause_recode']['319']='XIV. Diseases of the genitourinary system (N00-N98)'   # Whitespace 
-        d_json[yr]['358_cause_recode']['339']='XV. Pregnancy, childbirth and the puerperium (O00-O99)'   # Whitespace 
-        d_json[yr]['358_cause_recode']['356']='XVI. Certain conditions originating in the perinatal period (P00-P96)'   # Whitespace 
-        d_json[yr]['358_cause_recode']['365']='XVII. Congenital malformations, deformations and chromosomal abnormalities (Q00-Q99)'   # Whitespace 
-        d_json[yr]['358_cause_recode']['375']='XVIII. Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified (R00-R99)'   # Whitespace 
+    for yr, old_key, new_key, from_yr in code_key_fixes :
+        d_json[yr][new_key] = d_json[from_yr][new_key]
+        del d_json[yr][old_key]
+    return d_json
 
+#################################################
+#
+# Read in all JSON file input, patch, and confirm equivalence
+# return single JSON object, or False if there are discrepencies
+# 
+def build_codes (path, verbose=False) :
 
-    # Fix outlier key in year 2012
-    d_json[2012]['icd_code_10th_revision'] = d_json[2011]['icd_code_10th_revision']
-    del d_json[2012]['icd_code_10']
+    # Read JSON for each year for comparison, 
+    # save objects in dictionary key'd by year
+    d_json = {yr:read_code(path, yr) for yr in code_years}
+    patch_codes(d_json)
 
     # Confirm JSON for each year are equivalent, after updates
-    years = range(2005, 2015) 
-    eq_agg = True
+    # All differences for all years are found (and printed) in one pass
+    diffs = diff_codes(d_json)
 
-    for yr in years :
-        equiv = compare_seq(d_json[yr], d_json[2015]) 
-        if (not equiv) and verbose : print(f'JSON for years {yr} and 2015 are not equivalent')
-        eq_agg &= equiv
+    if verbose :
+        for yr in diffs :
+            print(f'JSON for years {yr} and {code_ref} are not equivalent')
+            for kind, path, val1, val2 in diffs[yr] :
+                print(f'    {kind} {"/".join(map(str, path))} : {val1} - {val2}')
     
-    if eq_agg :
-        return d_json[2015]
+    if not diffs :
+        return d_json[code_ref]
     else :
         if verbose : print('WARNING : Discrepencies found in JSON code data')
         return False
 
+#################################################
+#
+# Differences between each year and the reference year, returns dictionary 
+# key'd by year of the list of differences (see diff_seq()), only years with
+# differences are included
+#
+def diff_codes (d_json) :
+    diffs = {yr:diff_seq(d_json[yr], d_json[code_ref]) for yr in d_json if yr != code_ref}
+    return {yr:diffs[yr] for yr in diffs if diffs[yr]}
+
+#################################################
+#
+# Cache key for code superset, hash of the JSON file fingerprints and the
+# patch tables
+#
+def get_codes_key (path) :
+    files = [os.path.join(path, str(yr)+'_codes.json') for yr in code_years]
+    key   = [[get_file_fingerprint(f) for f in files], code_patches, code_key_fixes, code_ref]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+#################################################
+#
+# Read in all JSON file input, return single JSON object
+# With cache_file, the verified superset is saved and returned on later calls
+# as long as the JSON files and patch tables are unchanged
+# 
+def read_codes (path, verbose=False, cache_file=None) :
+
+    if cache_file is None :
+        return build_codes(path, verbose=verbose)
+
+    key = get_codes_key(path)
+    try :
+        with open(cache_file, 'r') as f_in :
+            cache = json.load(f_in)
+        if cache['key'] == key :
+            return cache['codes']
+    except (OSError, ValueError, KeyError) :
+        pass
+
+    result = build_codes(path, verbose=verbose)
+    if result :
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        with open(cache_file, 'w') as f_out :
+            json.dump({'key':key, 'codes':result}, f_out)
+    return result
+
+#################################################
+#
+# Confirm cached code superset matches the superset built from the JSON files
+# 
+def verify_codes_cache (path, cache_file, verbose=False) :
+    with open(cache_file, 'r') as f_in :
+        cached = json.load(f_in)['codes']
+    return compare_seq(cached, build_codes(path, verbose=verbose), verbose=verbose)
+
 
 
 ###############################################################################
@@ -289,6 +403,46 @@ def check_df_columns (data_dict, verbose=False) :
     return result
 
 
+###############################################################################
+#
+# Function to confirm the values in each coded column are a known code key, or
+# missing where the clean directives define a fill value. Dropped columns are
+# not checked. Check is one
+# vectorized isin() per column, on the categories of a categorical column.
+# Prints count of invalid values and a sample of invalid rows per column
+#
+
+def check_data_values (df, codes, replace_codes, verbose=False, samples=5) :
+    result = True
+
+    for col in df.columns :
+        if not (col in codes) or not codes[col] :
+            continue
+        if (col in replace_codes) and ((replace_codes[col][-1] == 'No code') or (replace_codes[col][0] == 'Drop')) :
+            continue
+
+        fill    = replace_codes[col][0] if (col in replace_codes) else 'None'
+        has_fill = (fill != 'None') and (fill != 'Drop')
+        allowed = list(codes[col].keys()) + ([fill] if has_fill else [])
+
+        s = df[col]
+        if s.dtype == 'category' :
+            valid = s.cat.categories.isin(allowed)
+            codes_arr = s.cat.codes.values
+            bad = (codes_arr >= 0) & ~valid[codes_arr]
+        else :
+            bad = ~s.isin(allowed).values & s.notna().values
+        if not has_fill :
+            bad |= s.isna().values
+
+        if bad.any() :
+            result = False
+            if verbose :
+                sample = s[bad].head(samples).astype(object).to_dict()
+                print(f'Invalid values in column {col} : {bad.sum()} rows, e.g. (row : value) {sample}')
+    return result
+
+
 ###############################################################################
 # Clean directive table, defines fillna and drop actions for data frames
 # Assumption is column names match the code keys, if code exists for that column
@@ -381,6 +535,587 @@ def get_clean() :
     }
 
 
+###############################################################################
+#
+# Function to split clean directives into the drop list and fillna dictionary
+# applied to each data frame (same for each year)
+#
+
+def get_clean_directives(clean) :
+    drop = [key for key in clean if clean[key][0]=='Drop']
+    fill = {key:clean[key][0] for key in clean if (clean[key][0]!='Drop') and (clean[key][0]!='None')}
+    return drop, fill
+
+
+###############################################################################
+#
+# Compact data types. Columns are read as pandas categoricals instead of python
+# string objects. The category domain of a coded column is the set of code keys
+# from the JSON superset plus the clean fill value, so every year and every
+# chunk share the same integer codes for the same value.
+#
+# Function returns dictionary of column name : list of known categories, only
+# for columns with a code (or a fill value). Other columns are read as 
+# categoricals with categories inferred from the data
+#
+
+def get_categories(codes, clean) :
+    categories = {}
+    for key in clean :
+        cats = list(codes[key].keys()) if (codes and key in codes) else []
+        fill = clean[key][0]
+        if (fill != 'None') and (fill != 'Drop') and not (fill in cats) :
+            cats.append(fill)
+        if cats :
+            categories[key] = cats
+    return categories
+
+###############################################################################
+#
+# Function to set the known category domain on a data frame read with 
+# dtype='category'. Values found in the data that are not known codes are kept
+# (appended to the domain) rather than lost to NaN
+#
+
+def set_categories(df, categories) :
+    for col in df.columns :
+        if not (col in categories) or (df[col].dtype != 'category') :
+            continue
+        known   = categories[col]
+        unknown = df[col].cat.categories.difference(known)
+        df[col] = df[col].cat.set_categories(known + list(unknown))
+    return df
+
+
+###############################################################################
+#
+# Column names that differ from the other years in a data file, renamed on read
+#
+
+data_col_renames = {2012:{'icd_code_10':'icd_code_10th_revision'}}
+
+def fix_columns(df, year) :
+    if year in data_col_renames :
+        df.rename(columns=data_col_renames[year], inplace=True)
+    return df
+
+
+###############################################################################
+#
+# Column projection. Columns to read are the clean keys that are not dropped,
+# limited to the columns needed by the load if need is not None. The returned
+# list is passed as usecols to the read functions, so dropped and unused 
+# columns are never parsed. None reads all columns
+#
+
+def get_usecols(clean, need=None) :
+    keep = [key for key in clean if clean[key][0] != 'Drop']
+    if need is None :
+        return keep
+    return [key for key in keep if key in need]
+
+def get_usecols_filter(year, usecols) :
+    if usecols is None :
+        return None
+    renames = data_col_renames.get(year, {})
+    keep    = set(usecols)
+    return lambda col : renames.get(col, col) in keep
+
+
+###############################################################################
+#
+# Read a full year of data. With categories, columns are read as categoricals
+# with the known code domain, otherwise as python string objects
+#
+
+def read_data(path, year, nrows=None, categories=None, usecols=None) :
+    file = os.path.join(path, str(year)+'_data.csv')
+    df   = pd.read_csv(file, nrows=nrows, dtype='object' if categories is None else 'category',
+                       usecols=get_usecols_filter(year, usecols))
+
+    # Correct outlier column value in 2012 data set
+    fix_columns(df, year)
+    if categories is not None :
+        set_categories(df, categories)
+    return df
+
+
+###############################################################################
+#
+# Columnar cache of the data read for each year. Each column of a categorical
+# data frame is saved as a numpy array of integer codes (one .npy file per 
+# column) plus its categories in meta.json. Later reads memory-map the code
+# arrays instead of parsing the csv file.
+#
+# Cache key is a hash of the source file fingerprint (size, modification time
+# and hash of the first and last MB), the category domains, clean directives 
+# nrows and columns read, so the cache is rebuilt if the file or the schema
+# changes
+#
+
+def get_file_fingerprint(file, sample=1<<20) :
+    stat = os.stat(file)
+    sha  = hashlib.sha1()
+    with open(file, 'rb') as f_in :
+        sha.update(f_in.read(sample))
+        if stat.st_size > sample :
+            f_in.seek(max(sample, stat.st_size-sample))
+            sha.update(f_in.read(sample))
+    return [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+
+def get_cache_key(file, categories, clean, nrows=None, usecols=None) :
+    key = [get_file_fingerprint(file), categories, clean, nrows, usecols]
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def write_data_cache(df, cache_dir, key) :
+    tmp_dir = cache_dir+'.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, col in enumerate(df.columns) :
+        np.save(os.path.join(tmp_dir, f'{i}.npy'), df[col].cat.codes.values)
+        columns.append({'name':col, 'categories':list(df[col].cat.categories)})
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f_out :
+        json.dump({'key':key, 'nrows':df.shape[0], 'columns':columns}, f_out)
+
+    # Replace any previous cache for the year only when complete
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.rename(tmp_dir, cache_dir)
+
+def check_data_cache(cache_dir, key) :
+    try :
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f_in :
+            return json.load(f_in)['key'] == key
+    except (OSError, ValueError, KeyError) :
+        return False
+
+def read_data_cache(cache_dir, key) :
+    try :
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f_in :
+            meta = json.load(f_in)
+    except (OSError, ValueError) :
+        return None
+    if meta['key'] != key :
+        return None
+
+    data = {}
+    for i, col in enumerate(meta['columns']) :
+        codes = np.load(os.path.join(cache_dir, f'{i}.npy'), mmap_mode='r')
+        data[col['name']] = pd.Categorical.from_codes(codes, col['categories'])
+    return pd.DataFrame(data, index=pd.RangeIndex(meta['nrows']))
+
+###############################################################################
+#
+# Read a full year of data as categoricals through the cache, the csv file is 
+# parsed only if there is no valid cache for the year
+#
+
+def read_data_cached(path, year, cache_path, categories, clean, nrows=None, usecols=None, verbose=False) :
+    file      = os.path.join(path, str(year)+'_data.csv')
+    cache_dir = os.path.join(cache_path, str(year))
+    key       = get_cache_key(file, categories, clean, nrows, usecols)
+
+    df = read_data_cache(cache_dir, key)
+    if df is None :
+        if verbose : print(f'Cache miss for {year}, reading {file}')
+        df = read_data(path, year, nrows=nrows, categories=categories, usecols=usecols)
+        write_data_cache(df, cache_dir, key)
+    return df
+
+
+###############################################################################
+#
+# Stage result cache. Results of the check and clean stages are kept in 
+# cache_path keyed by a hash of the stage inputs and configuration, so a re-run
+# with the same inputs skips the stage. Check results are saved as JSON, 
+# cleaned data frames in the columnar cache as <year>_clean
+#
+
+def get_stage_key(*inputs) :
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def read_stage_result(cache_path, name, key) :
+    try :
+        with open(os.path.join(cache_path, name+'.json'), 'r') as f_in :
+            cache = json.load(f_in)
+    except (OSError, ValueError) :
+        return None
+    return cache['result'] if cache.get('key') == key else None
+
+def write_stage_result(cache_path, name, key, result) :
+    os.makedirs(cache_path, exist_ok=True)
+    with open(os.path.join(cache_path, name+'.json'), 'w') as f_out :
+        json.dump({'key':key, 'result':result}, f_out)
+
+
+###############################################################################
+#
+# Parallel extract and clean. prepare_year() reads a year (through the data
+# cache if use_cache), checks the code values if codes are given (and the cause
+# recodes against the ICD-10 ranges if recodes), applies the drop and fill
+# directives and writes the cleaned data frame to the columnar cache in 
+# clean_dir. It runs in a worker process, only the warnings, row count and 
+# stage records are returned, the parent reads the cleaned data memory mapped
+# from the cache instead of receiving pickled columns.
+#
+# prepare_years() runs one job (dictionary of prepare_year() arguments) per 
+# year in a pool of worker processes, returns the results in job order and
+# adds the worker stage records to the parent's. Workers are forked, the ETL 
+# script has no main guard and would be re-run by spawned workers, where fork
+# is not available the jobs run in this process
+#
+
+def prepare_year(path, year, cache_path, clean_dir, clean_key, categories, clean, drop, fill, 
+                 nrows=None, usecols=None, use_cache=True, codes=None, recodes=False, verbose=False) :
+    first = len(perf.stages)
+    with perf.stage(f'read_data {year}') as st :
+        if use_cache :
+            df = read_data_cached(path, year, cache_path, categories, clean, nrows=nrows, usecols=usecols, verbose=verbose)
+        else :
+            df = read_data(path, year, nrows=nrows, categories=categories, usecols=usecols)
+        st['rows_out'] = df.shape[0]
+
+    warnings = []
+    if codes :
+        with perf.stage(f'check_data_values {year}', rows_in=df.shape[0]) :
+            if not check_data_values(df, codes, clean, verbose=verbose) :
+                warnings.append(f'WARNING : Unknown code values in {year} data')
+    if codes and recodes :
+        with perf.stage(f'check_recodes {year}', rows_in=df.shape[0]) :
+            if not check_recodes(df, read_code(path, year), verbose=verbose) :
+                warnings.append(f'WARNING : Cause recodes disagree with ICD-10 ranges in {year} data')
+
+    with perf.stage(f'clean {year}', rows_in=df.shape[0]) :
+        df.drop(columns=[c for c in drop if c in df.columns], inplace=True)
+        df.fillna(fill, inplace=True)
+        write_data_cache(df, clean_dir, clean_key)
+    return {'year':year, 'rows':df.shape[0], 'warnings':warnings, 'stages':perf.stages[first:]}
+
+def prepare_years(jobs, workers=4) :
+    if not ('fork' in multiprocessing.get_all_start_methods()) :
+        return [prepare_year(**job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1)), 
+                             mp_context=multiprocessing.get_context('fork')) as pool :
+        futures = [pool.submit(prepare_year, **job) for job in jobs]
+        results = [f.result() for f in futures]
+    for r in results :
+        perf.stages.extend(r['stages'])
+    return results
+
+
+###############################################################################
+#
+# Streaming read of a single year of data. Yields data frames of at most
+# chunksize rows with drop/fill directives applied, so only one chunk of the 
+# year is held in memory at a time. Row index continues across chunks, so the
+# index matches the index of a full read of the same file.
+#
+
+def read_data_chunks(path, year, chunksize, nrows=None, drop=[], fill={}, categories=None, usecols=None) :
+    file   = os.path.join(path, str(year)+'_data.csv')
+    reader = pd.read_csv(file, nrows=nrows, dtype='object' if categories is None else 'category', 
+                         chunksize=chunksize, usecols=get_usecols_filter(year, usecols))
+
+    for chunk in reader :
+        # Correct outlier column value in 2012 data set
+        fix_columns(chunk, year)
+        if categories is not None :
+            set_categories(chunk, categories)
+        chunk.drop(columns=[c for c in drop if c in chunk.columns], inplace=True)
+        chunk.fillna(fill, inplace=True)
+        yield chunk
+
+
+###############################################################################
+#
+# Read only the header of a single year of data, used to check columns in
+# streaming mode without reading the data
+#
+
+def read_data_header(path, year) :
+    file = os.path.join(path, str(year)+'_data.csv')
+    df   = pd.read_csv(file, nrows=0, dtype='object')
+    return fix_columns(df, year)
+
+
+###############################################################################
+#
+# Star schema transform. Each coded column gets a dimension with a small 
+# integer surrogate key, the position of the code in the dimension. Dimension
+# keys are the known category domain (see get_categories()) followed by any 
+# unknown values found in the data frames, so known codes keep the same key
+# for every year. Columns without codes are not dimensions. With unknown, 
+# each dimension ends with the reserved unknown_key, for values not in the
+# dimension when the data is not known in advance (stream mode).
+#
+# Function returns dictionary of column name : list of dimension keys
+#
+
+unknown_key = '<unknown>'
+
+def get_dimensions(frames, codes, categories, unknown=False) :
+    dims = {}
+    for col in codes :
+        if not codes[col] or not any([col in df.columns for df in frames]) :
+            continue
+        keys = categories[col] if (col in categories) else list(codes[col].keys())
+
+        values = set()
+        for df in frames :
+            if col in df.columns :
+                s = df[col]
+                values.update(s.cat.categories if s.dtype == 'category' else s.dropna().unique())
+        dims[col] = keys + sorted(values.difference(keys)) + ([unknown_key] if unknown else [])
+    return dims
+
+###############################################################################
+#
+# Dimension table for a column : surrogate id, code key and code description
+# (None for keys without a code, e.g. unknown values, 'Unknown value' for the
+# reserved unknown_key)
+#
+
+def get_dimension_frame(col, keys, codes) :
+    return pd.DataFrame({'id'     : np.arange(len(keys)),
+                         'ckey'   : keys,
+                         'cvalue' : [codes[col].get(k, 'Unknown value' if k == unknown_key else None) for k in keys]})
+
+###############################################################################
+#
+# Fact table from a data frame. Dimension columns are replaced by fk_<column>
+# holding the surrogate key, computed in one vectorized pass as the categorical
+# codes against the dimension keys (smallest integer type, missing values are
+# null). Values not in the dimension get the unknown_key surrogate if the 
+# dimension has one, null otherwise, and are counted per column in unknowns.
+# Other columns are kept as is.
+#
+
+def get_fact(df, dims, unknowns=None) :
+    fact = pd.DataFrame(index=df.index)
+    for col in df.columns :
+        if col in dims :
+            codes = pd.Categorical(df[col], categories=dims[col]).codes
+            bad   = (codes < 0) & df[col].notna().values
+            if bad.any() :
+                if unknowns is not None :
+                    unknowns[col] += int(bad.sum())
+                if dims[col][-1] == unknown_key :
+                    codes = np.where(bad, len(dims[col])-1, codes).astype(codes.dtype)
+            fact['fk_'+col] = pd.arrays.IntegerArray(codes, mask=codes < 0)
+        else :
+            fact[col] = df[col]
+    return fact
+
+
+###############################################################################
+#
+# Mapped data frame, code keys replaced by their descriptions (mapped_person).
+# For each coded column a lookup array of descriptions is built once for the
+# categories, then taken by the categorical codes, no per row mapping. Values
+# without a code description are kept as is. The result is categorical over 
+# the unique descriptions
+#
+
+def get_mapped(df, codes) :
+    mapped = pd.DataFrame(index=df.index)
+    for col in df.columns :
+        if not (col in codes) or not codes[col] :
+            mapped[col] = df[col]
+            continue
+
+        s    = df[col] if df[col].dtype == 'category' else df[col].astype('category')
+        desc = np.array([codes[col].get(k, k) for k in s.cat.categories], dtype=object)
+        uniq, inverse = np.unique(desc, return_inverse=True)
+
+        cat_codes = s.cat.codes.values
+        new_codes = np.where(cat_codes >= 0, inverse.take(cat_codes), -1)
+        mapped[col] = pd.Categorical.from_codes(new_codes, uniq)
+    return mapped
+
+
+###############################################################################
+#
+# Rollup tables, death counts by year, age recodes, cause recode, sex and race.
+# One rollup per cause recode, all age recodes in each (the age recodes nest, 
+# so together they add few groups). Counts are a vectorized groupby on the
+# categorical columns, only observed groups are kept. Counts of separate blocks
+# of the same year are added by combine_rollups()
+#
+
+rollup_causes = ['358_cause_recode', '113_cause_recode', '39_cause_recode', '130_infant_cause_recode']
+
+def get_rollups(keepcols) :
+    return {'rollup_'+c : ['current_data_year'] + keepcols + [c, 'sex', 'race'] for c in rollup_causes}
+
+def get_rollup(df, cols) :
+    counts = df.groupby(cols, observed=True, sort=False).size()
+    return counts.rename('deaths').reset_index()
+
+def combine_rollups(parts, cols) :
+    counts = pd.concat(parts).groupby(cols, observed=True, sort=False)['deaths'].sum()
+    return counts.reset_index()
+
+
+###############################################################################
+#
+# Multiple cause of death table (person_cause). The entity_condition_<n> and 
+# record_condition_<n> columns are melted into one row per condition : person
+# id (the index), axis ('E' entity, 'R' record), position n, line and ICD-10
+# code, sorted by person id. Entity axis conditions start with the part and 
+# line of the certificate, split into line. Empty slots (NaN or a clean fill
+# value) are skipped. Each column is done in one vectorized pass, code and 
+# line are split once per category, no loop over rows
+#
+
+condition_axes = {'E':'entity_condition_', 'R':'record_condition_'}
+
+def get_condition_cols(cols) :
+    return [c for c in cols for prefix in condition_axes.values()
+            if c.startswith(prefix) and c[len(prefix):].isdigit()]
+
+def get_conditions(df, ids=None, empty=('', '0000')) :
+    ids   = df.index.values if ids is None else np.asarray(ids)
+    parts = []
+    for col in get_condition_cols(df.columns) :
+        axis = [a for a in condition_axes if col.startswith(condition_axes[a])][0]
+        s    = df[col] if df[col].dtype == 'category' else df[col].astype('category')
+
+        cats  = pd.Index(s.cat.categories.astype(str))
+        codes = s.cat.codes.values
+        mask  = codes >= 0
+        mask[mask] = ~cats.isin(empty)[codes[mask]]
+        if not mask.any() :
+            continue
+
+        has_line = (cats.str.len() > 2) & cats.str[:2].str.isdigit() if axis == 'E' else np.zeros(len(cats), bool)
+        cat_line = np.where(has_line, cats.str[:2], None)
+        cat_code = np.where(has_line, cats.str[2:], cats)
+        take = codes[mask]
+        parts.append(pd.DataFrame({'person_id':ids[mask], 'axis':axis, 'position':int(col[len(condition_axes[axis]):]),
+                                   'line':cat_line[take], 'code':cat_code[take]}))
+
+    if not parts :
+        return pd.DataFrame(columns=['person_id', 'axis', 'position', 'line', 'code']).set_index('person_id')
+    return pd.concat(parts, ignore_index=True).sort_values('person_id', kind='stable').set_index('person_id')
+
+
+###############################################################################
+#
+# ICD-10 range interval index for the cause recodes. Recode descriptions end
+# with the ICD-10 codes of the recode, e.g. 'Other acute lower respiratory 
+# infections (J20-J22,U04)'. Codes are normalized to an integer, letter*1000 
+# plus category and subcategory digits. A range starts at the first and ends
+# at the last subcategory, so J20-J22 is [J200, J229] and U04 is [U040, U049].
+#
+# compile_recode_index() splits all intervals of a recode scheme in sorted
+# elementary segments, each mapped to the narrowest recode covering it as the
+# recodes nest within chapters (the later recode for equal ranges, sub items
+# follow their item). Segments are swept in order with a heap of the intervals
+# covering them. get_recode_index() compiles a scheme once per distinct set of
+# descriptions. get_recode() maps a column of ICD-10 codes to the recode with 
+# one searchsorted over the segment starts, once per category.
+# Recodes for a year with other range definitions are derived with an index
+# compiled from that year's codes, read_code(path, year)
+#
+
+icd_code_re = re.compile(r'^\*?([A-Z])(\d{2})(?:\.?(\d)\d*)?$')
+
+def get_icd_value(code, upper=False) :
+    m = icd_code_re.match(str(code).strip().upper())
+    if m is None :
+        return None
+    letter, cat, sub = m.groups()
+    sub = sub if sub is not None else ('9' if upper else '0')
+    return (ord(letter)-ord('A'))*1000 + int(cat)*10 + int(sub)
+
+def get_icd_ranges(desc) :
+    for group in reversed(re.findall(r'\(([^()]*)\)', desc)) :
+        ranges = []
+        for token in group.replace(' ', '').split(',') :
+            first, _, last = token.partition('-')
+            lo = get_icd_value(first)
+            hi = get_icd_value(last or first, upper=True)
+            if (lo is None) or (hi is None) or (hi < lo) :
+                ranges = []
+                break
+            ranges.append((lo, hi))
+        if ranges :
+            return ranges
+    return []
+
+def compile_recode_index(descs) :
+    intervals = [(lo, hi, key) for key, desc in descs.items() for lo, hi in get_icd_ranges(desc)]
+    if not intervals :
+        return None
+    starts = sorted(set([lo for lo, hi, key in intervals] + [hi+1 for lo, hi, key in intervals]))
+    order  = sorted(range(len(intervals)), key=lambda i : intervals[i][0])
+    cover  = []
+    keys   = []
+    j = 0
+    # Segments never straddle a bound, an interval covers a segment from its
+    # low bound until its high bound is passed
+    for start in starts[:-1] :
+        while j < len(order) and intervals[order[j]][0] <= start :
+            lo, hi, key = intervals[order[j]]
+            heapq.heappush(cover, (hi-lo, -order[j], hi, key))
+            j += 1
+        while cover and cover[0][2] < start :
+            heapq.heappop(cover)
+        keys.append(cover[0][3] if cover else None)
+    # Past the last bound and (index -1) before the first bound : no recode
+    return np.array(starts), np.array(keys + [None, None], dtype=object)
+
+recode_indexes = {}
+
+def get_recode_index(descs) :
+    key = tuple(sorted(descs.items()))
+    if not (key in recode_indexes) :
+        recode_indexes[key] = compile_recode_index(descs)
+    return recode_indexes[key]
+
+def get_recode(s, index) :
+    starts, keys = index
+    s    = s if s.dtype == 'category' else s.astype('category')
+    vals = np.array([get_icd_value(c) for c in s.cat.categories], dtype=float)
+    cat_keys = keys[np.searchsorted(starts, np.nan_to_num(vals, nan=-1), side='right')-1]
+
+    recodes   = sorted(set([k for k in cat_keys if k is not None]))
+    pos       = {k:i for i, k in enumerate(recodes)}
+    cat_codes = np.array([pos.get(k, -1) for k in cat_keys] + [-1])
+    return pd.Series(pd.Categorical.from_codes(cat_codes[s.cat.codes.values], recodes), index=s.index)
+
+###############################################################################
+#
+# Verify the cause recode columns against the recodes derived from the ICD-10
+# code column, codes are the year's codes, read_code(path, year), so each year
+# is checked against its own range definitions. Rows with a code outside all
+# ranges are not compared. Returns False if more than tol of the compared rows
+# of a scheme disagree
+#
+
+def check_recodes(df, codes, icd_col='icd_code_10th_revision', schemes=rollup_causes, tol=0.01, verbose=False) :
+    result = True
+    for scheme in schemes :
+        if not (scheme in df.columns) or not (icd_col in df.columns) or not (scheme in codes) :
+            continue
+        index = get_recode_index(codes[scheme])
+        if index is None :
+            if verbose : print(f'No ICD-10 ranges in {scheme} descriptions')
+            continue
+
+        derived  = get_recode(df[icd_col], index)
+        both     = (derived.notna() & df[scheme].notna()).values
+        agree    = (derived.values.astype(object)[both] == df[scheme].values.astype(object)[both]).sum()
+        compared = both.sum()
+        if verbose :
+            print(f'{scheme} : {agree} of {compared} rows agree with ICD-10 ranges, '
+                  f'{df.shape[0]-compared} rows not compared')
+        if compared and (compared-agree) > tol*compared :
+            result = False
+    return result
+
+
 ###############################################################################
 #
 # if run from terminal, call function to check JSON files as test
@@ -388,3 +1123,5 @@ def get_clean() :
 
 if __name__ == '__main__' :
     read_codes('./', verbose=True)
+    if os.path.exists('./cache/codes.json') :
+        print('Cached code superset matches :', verify_codes_cache('./', './cache/codes.json', verbose=True))
@@ -53,6 +53,7 @@ SELECT p.id, ar52.cvalue AS 'RECODE 52', ar27.cvalue AS 'RECODE 27', ar12.cvalue
 
 -- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
 -- This table would be tyhe structure for already mapped  data for refrence
+-- Loaded by the program with run control mapped = True, no join needed to read mapped data
 -- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
 
 CREATE TABLE  IF NOT EXISTS mapped_person( 
@@ -98,3 +99,81 @@ icd_code_10th_revision VARCHAR(1024),
  hispanic_originrace_recode VARCHAR(1024));
 
 
+
+
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+-- Star schema (run control star = True) : one dim_<code> table per coded column, small integer
+-- surrogate keys (TINYINT/SMALLINT by number of codes), fact_person with a fk_<code> per dimension
+-- Example dimension and query, full DDL is generated from the codes by the program
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+
+CREATE TABLE IF NOT EXISTS dim_age_recode_52( 
+id TINYINT NOT NULL PRIMARY KEY, 
+ckey VARCHAR(255) NOT NULL, 
+cvalue VARCHAR(1024) );
+
+SELECT f.id, ar52.cvalue AS 'RECODE 52', ar27.cvalue AS 'RECODE 27', ar12.cvalue AS 'RECODE 12', iar22.cvalue AS 'INFANT RECODE 22'
+	FROM fact_person AS f 
+		LEFT JOIN dim_age_recode_52 AS ar52 ON f.fk_age_recode_52 = ar52.id
+		LEFT JOIN dim_age_recode_27 AS ar27 ON f.fk_age_recode_27 = ar27.id
+		LEFT JOIN dim_age_recode_12 AS ar12 ON f.fk_age_recode_12 = ar12.id
+		LEFT JOIN dim_infant_age_recode_22 AS iar22 ON f.fk_infant_age_recode_22 = iar22.id;
+
+
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+-- Rollup tables (run control rollup = True) : death counts by year, age recodes, cause recode, sex and race
+-- one table per cause recode, rollup_358_cause_recode, rollup_113_cause_recode, rollup_39_cause_recode
+-- and rollup_130_infant_cause_recode. Example, deaths by year and 39 cause recode
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+
+SELECT r.current_data_year, r.`39_cause_recode`, SUM(r.deaths) AS deaths
+	FROM rollup_39_cause_recode AS r
+	GROUP BY r.current_data_year, r.`39_cause_recode`;
+
+
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+-- Multi-year person table (run control multi_year = True) : global id = year*100000000 + row, range partitioned
+-- by current_data_year, one partition per year. Partitioned tables have no foreign keys, codes are validated
+-- after the load. A year is reloaded with ALTER TABLE person TRUNCATE PARTITION p<year>
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+
+CREATE TABLE  IF NOT EXISTS person( 
+id BIGINT NOT NULL, 
+current_data_year SMALLINT NOT NULL, 
+fk_age_recode_52 VARCHAR(255) DEFAULT '', 
+fk_age_recode_27 VARCHAR(255) DEFAULT '', 
+fk_age_recode_12 VARCHAR(255) DEFAULT '', 
+fk_infant_age_recode_22 VARCHAR(255) DEFAULT '', 
+PRIMARY KEY (id, current_data_year)) 
+PARTITION BY RANGE (current_data_year) ( 
+	PARTITION p2005 VALUES LESS THAN (2006), PARTITION p2006 VALUES LESS THAN (2007), PARTITION p2007 VALUES LESS THAN (2008), 
+	PARTITION p2008 VALUES LESS THAN (2009), PARTITION p2009 VALUES LESS THAN (2010), PARTITION p2010 VALUES LESS THAN (2011), 
+	PARTITION p2011 VALUES LESS THAN (2012), PARTITION p2012 VALUES LESS THAN (2013), PARTITION p2013 VALUES LESS THAN (2014), 
+	PARTITION p2014 VALUES LESS THAN (2015), PARTITION p2015 VALUES LESS THAN (2016), PARTITION pmax VALUES LESS THAN MAXVALUE );
+
+-- Reads only partition p2015
+SELECT ar52.cvalue AS 'RECODE 52', COUNT(*) AS deaths
+	FROM person AS p 
+		LEFT JOIN age_recode_52 AS ar52 ON p.fk_age_recode_52 = ar52.ckey
+	WHERE p.current_data_year = 2015
+	GROUP BY ar52.cvalue;
+
+
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+-- Multiple cause table (run control causes = True) : one row per entity (E) or record (R) axis condition of a person,
+-- built from entity_condition_1..20 and record_condition_1..20, line is the certificate part and line of entity conditions
+-- ----- ------------------------------------ ------------------------------------ ------------------------------------ ------------------------------------
+
+CREATE TABLE IF NOT EXISTS person_cause( 
+person_id BIGINT NOT NULL, 
+axis CHAR(1) NOT NULL, 
+position TINYINT NOT NULL, 
+line CHAR(2), 
+code VARCHAR(8) NOT NULL, 
+PRIMARY KEY (person_id, axis, position), 
+INDEX idx_cause_code (code) );
+
+-- All deaths mentioning a code on the record axis, index seek on code
+SELECT COUNT(DISTINCT c.person_id) AS deaths
+	FROM person_cause AS c
+	WHERE c.axis = 'R' AND c.code = 'J189';
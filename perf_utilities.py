@@ -0,0 +1,116 @@
+###############################################################################
+#
+# Instrumentation for the mortality ETL
+#
+# Each stage of the pipeline is timed with the stage() context manager, which
+# records wall time, CPU time, peak resident memory, rows in/out and rows/sec.
+# Each block loaded to the database is recorded with record_block(). The
+# records are written as a JSON run report by write_report(), optionally with
+# a histogram of the block load throughput.
+
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+try :
+    import resource
+except ImportError :   # Not available on Windows, peak memory not reported
+    resource = None
+
+stages = []
+blocks = []
+
+
+###############################################################################
+#
+# Peak resident memory of the process in MB (ru_maxrss is KB on linux, bytes
+# on macOS)
+#
+
+def get_peak_rss() :
+    if resource is None :
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/(1024*1024) if sys.platform == 'darwin' else rss/1024
+
+
+###############################################################################
+#
+# Context manager to time a stage, yields the stage record so rows_in and
+# rows_out can be set inside the with block. rows/sec uses rows_out, or
+# rows_in if rows_out is not set
+#
+
+@contextmanager
+def stage(name, rows_in=None, rows_out=None) :
+    rec  = {'stage':name, 'rows_in':rows_in, 'rows_out':rows_out}
+    wall = time.perf_counter()
+    cpu  = time.process_time()
+    try :
+        yield rec
+    finally :
+        rec['wall_secs']   = time.perf_counter()-wall
+        rec['cpu_secs']    = time.process_time()-cpu
+        rec['peak_rss_mb'] = get_peak_rss()
+        rows = rec['rows_out'] if rec['rows_out'] is not None else rec['rows_in']
+        rec['rows_per_sec'] = rows/rec['wall_secs'] if (rows and rec['wall_secs'] > 0) else None
+        stages.append(rec)
+
+
+###############################################################################
+#
+# Record a block loaded to a table
+#
+
+def record_block(table, id_start, id_stop, rows, secs) :
+    blocks.append({'table':table, 'id_start':id_start, 'id_stop':id_stop, 'rows':rows, 'secs':secs,
+                   'rows_per_sec':rows/secs if secs > 0 else None})
+
+
+###############################################################################
+#
+# Histogram of block throughput (rows/sec), per table
+#
+
+def get_histogram(bins=10) :
+    import numpy as np   # Only needed for the report, not imported by check-only runs
+
+    hist = {}
+    for table in sorted(set([b['table'] for b in blocks])) :
+        rate = [b['rows_per_sec'] for b in blocks if b['table'] == table and b['rows_per_sec']]
+        if not rate :
+            continue
+        counts, edges = np.histogram(rate, bins=bins)
+        hist[table] = {'counts':counts.tolist(), 'edges':edges.tolist(),
+                       'min':min(rate), 'median':float(np.median(rate)), 'max':max(rate)}
+    return hist
+
+
+###############################################################################
+#
+# Write JSON run report, run is a dictionary of run control values to include
+#
+
+def write_report(file, run={}, hist=True, bins=10) :
+    report = {'time':time.strftime('%Y-%m-%d %H:%M:%S'), 'run':run, 'stages':stages, 'blocks':blocks}
+    if hist :
+        report['histogram'] = get_histogram(bins)
+    with open(file, 'w') as f_out :
+        json.dump(report, f_out, indent=1, default=str)
+
+
+###############################################################################
+#
+# Print a one line summary per stage
+#
+
+def print_summary() :
+    for rec in stages :
+        rate = f", {int(rec['rows_per_sec'])} rows/sec" if rec['rows_per_sec'] else ''
+        print(f"{rec['stage']:<32} : {rec['wall_secs']:8.2f} secs wall, {rec['cpu_secs']:8.2f} secs cpu, "
+              f"{rec['peak_rss_mb'] or 0:8.1f} MB peak{rate}")
+
+def reset() :
+    del stages[:]
+    del blocks[:]